@@ -3,20 +3,32 @@
 # -*- coding: utf-8 -*-
 
 import os
+import hashlib
+import operator
 from pathlib import Path
-from datetime import datetime
+from typing import BinaryIO
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from urllib.parse import quote
 
 # ---- 仓库信息（GitHub Actions 会自动从 env 取；本地跑用默认值）----
 REPO_FULL = os.getenv("GITHUB_REPOSITORY", "kl543/mbe3-controller")  # 形如 user/repo
 BRANCH    = os.getenv("GITHUB_REF_NAME", "main")
 OWNER, REPO_NAME = (REPO_FULL.split("/", 1) + [""])[:2]
+IN_CI     = os.getenv("GITHUB_ACTIONS") == "true"
 
 # ---- 路径 ----
 ROOT     = Path(__file__).resolve().parents[1]   # repo root
 DATA_DIR = ROOT / "data"
 NB_DIR   = ROOT / "notebooks"                    # 可选：也支持根目录下的 .ipynb
 OUT_HTML = ROOT / "index.html"
+SIG_FILE = ROOT / ".cache" / "docs.sig"         # 上次生成时输入树的指纹
+_ROOT_PREFIX = str(ROOT) + os.sep                # 扫描到的路径都在 ROOT 下
+
+# 生成时间只取一次（utcnow() 在 3.12 已弃用）
+_NOW     = datetime.now(timezone.utc)
+_NOW_STR = _NOW.strftime("%Y-%m-%d %H:%M UTC")
 
 MAIN_SITE    = "https://kl543.github.io"
 PROJECTS_URL = f"{MAIN_SITE}/projects.html"
@@ -27,6 +39,10 @@ def q(p: Path | str) -> str:
         p = p.as_posix()
     return quote(p, safe="/-._")
 
+# ROOT 下的绝对路径字符串 -> 仓库相对 posix 路径（不构造 Path）
+def _rel(path_str: str) -> str:
+    return path_str.removeprefix(_ROOT_PREFIX).replace(os.sep, "/")
+
 def h(s: str) -> str:
     return (
         s.replace("&", "&amp;")
@@ -35,46 +51,47 @@ def h(s: str) -> str:
          .replace('"', "&quot;")
     )
 
+_NB_BASE  = f"https://nbviewer.org/github/{REPO_FULL}/blob/{BRANCH}/"
+_RAW_BASE = f"https://raw.githubusercontent.com/{REPO_FULL}/{BRANCH}/"
+
 def nbviewer_url(rel_path: str) -> str:
-    return f"https://nbviewer.org/github/{REPO_FULL}/blob/{BRANCH}/{q(rel_path)}"
+    return _NB_BASE + q(rel_path)
 
 def raw_url(rel_path: str) -> str:
-    return f"https://raw.githubusercontent.com/{REPO_FULL}/{BRANCH}/{q(rel_path)}"
+    return _RAW_BASE + q(rel_path)
 
 # ------------------------ 共享页眉（与 STM 相同风格） ------------------------
-def load_site_header() -> str:
-    for p in [ROOT / "_site-header.html", ROOT.parent / "_site-header.html"]:
-        if p.exists():
-            return p.read_text(encoding="utf-8")
-    # fallback header
-    return f"""<!doctype html>
+# fallback 页眉：CSS 是纯静态文本，单独放常量，不用在 f-string 里双写花括号
+_FALLBACK_STYLE = """<style>
+:root{--line:#e9e9e9;--muted:#666;--ink:#111}
+body{margin:0;font-family:system-ui,-apple-system,Segoe UI,Roboto,Helvetica,Arial,sans-serif;color:var(--ink);line-height:1.6}
+header{background:#111;color:#fff;padding:30px 16px;text-align:center}
+nav{display:flex;gap:14px;justify-content:center;margin:10px 0 0}
+nav a{color:#fff;text-decoration:none;opacity:.9} nav a:hover{opacity:1}
+.container{max-width:1040px;margin:24px auto;padding:0 16px}
+.muted{color:var(--muted)}
+.card{border:1px solid var(--line);border-radius:16px;padding:16px 18px;margin:16px 0;background:#fff}
+h1,h2,h3{margin:.2rem 0 .6rem}
+.btn{display:inline-block;border:1px solid var(--line);padding:8px 12px;border-radius:10px;text-decoration:none;margin-right:8px;color:#111}
+.btn:hover{background:#f6f6f6}
+.grid{display:grid;grid-template-columns:repeat(auto-fill,minmax(260px,1fr));gap:14px}
+.thumb{border:1px solid var(--line);border-radius:12px;padding:6px;background:#fff}
+.thumb img{width:100%;height:auto;display:block;border-radius:8px}
+.center{text-align:center}
+.backline{margin:6px 0 0;}
+.run-grid{display:grid;grid-template-columns:repeat(auto-fill,minmax(240px,1fr));gap:12px;margin-top:8px}
+.tile{display:block;border:1px solid var(--line);border-radius:12px;overflow:hidden;background:#fff;text-decoration:none;color:inherit}
+.tile img{width:100%;display:block;aspect-ratio:4/3;object-fit:cover}
+.tile .cap{padding:8px 10px;font-size:13px;color:var(--muted);border-top:1px solid var(--line)}
+</style>
+"""
+
+_FALLBACK_HEADER = f"""<!doctype html>
 <html lang="en"><head>
 <meta charset="utf-8" />
 <meta name="viewport" content="width=device-width,initial-scale=1" />
 <title>MBE3 Heating Stage Controller — Kaiming Liu</title>
-<style>
-:root{{--line:#e9e9e9;--muted:#666;--ink:#111}}
-body{{margin:0;font-family:system-ui,-apple-system,Segoe UI,Roboto,Helvetica,Arial,sans-serif;color:var(--ink);line-height:1.6}}
-header{{background:#111;color:#fff;padding:30px 16px;text-align:center}}
-nav{{display:flex;gap:14px;justify-content:center;margin:10px 0 0}}
-nav a{{color:#fff;text-decoration:none;opacity:.9}} nav a:hover{{opacity:1}}
-.container{{max-width:1040px;margin:24px auto;padding:0 16px}}
-.muted{{color:var(--muted)}}
-.card{{border:1px solid var(--line);border-radius:16px;padding:16px 18px;margin:16px 0;background:#fff}}
-h1,h2,h3{{margin:.2rem 0 .6rem}}
-.btn{{display:inline-block;border:1px solid var(--line);padding:8px 12px;border-radius:10px;text-decoration:none;margin-right:8px;color:#111}}
-.btn:hover{{background:#f6f6f6}}
-.grid{{display:grid;grid-template-columns:repeat(auto-fill,minmax(260px,1fr));gap:14px}}
-.thumb{{border:1px solid var(--line);border-radius:12px;padding:6px;background:#fff}}
-.thumb img{{width:100%;height:auto;display:block;border-radius:8px}}
-.center{{text-align:center}}
-.backline{{margin:6px 0 0;}}
-.run-grid{{display:grid;grid-template-columns:repeat(auto-fill,minmax(240px,1fr));gap:12px;margin-top:8px}}
-.tile{{display:block;border:1px solid var(--line);border-radius:12px;overflow:hidden;background:#fff;text-decoration:none;color:inherit}}
-.tile img{{width:100%;display:block;aspect-ratio:4/3;object-fit:cover}}
-.tile .cap{{padding:8px 10px;font-size:13px;color:var(--muted);border-top:1px solid var(--line)}}
-</style>
-</head>
+{_FALLBACK_STYLE}</head>
 <body>
 <header>
   <h1>MBE3 Heating Stage Controller</h1>
@@ -90,52 +107,108 @@ h1,h2,h3{{margin:.2rem 0 .6rem}}
 </header>
 """
 
+def load_site_header() -> str:
+    for p in [ROOT / "_site-header.html", ROOT.parent / "_site-header.html"]:
+        try:
+            return p.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            continue
+    # fallback header
+    return _FALLBACK_HEADER
+
+# 页眉在一次运行内不变：导入时读取并编码一次
+_HEADER_BYTES = load_site_header().encode("utf-8")
+
 # ------------------------ 列出 notebooks ------------------------
 def list_notebooks() -> list[tuple[str, str, str]]:
     items: list[tuple[str, str, str]] = []
-    # 根目录 .ipynb
-    for nb in sorted(ROOT.glob("*.ipynb")):
-        rel = nb.name
-        items.append((rel, nbviewer_url(rel), raw_url(rel)))
-    # notebooks/ 目录
-    if NB_DIR.exists():
-        for nb in sorted(NB_DIR.glob("*.ipynb")):
-            rel = nb.relative_to(ROOT).as_posix()
+    # 根目录 .ipynb 在前，notebooks/ 目录在后；两个目录的相对路径不会重复，无需去重
+    for base, prefix in ((ROOT, ""), (NB_DIR, "notebooks/")):
+        try:
+            with os.scandir(base) as it:
+                names = sorted(e.name for e in it if e.name.endswith(".ipynb") and e.is_file())
+        except FileNotFoundError:
+            continue
+        for name in names:
+            rel = prefix + name
             items.append((rel, nbviewer_url(rel), raw_url(rel)))
-    # 去重（按路径）
-    seen, uniq = set(), []
-    for rel, v, d in items:
-        if rel not in seen:
-            uniq.append((rel, v, d))
-            seen.add(rel)
-    return uniq
+    return items
 
 # ------------------------ Runs（保留你原来块） ------------------------
-def runs_sections() -> str:
-    if not DATA_DIR.exists():
-        return '<div class="muted">No data/ directory.</div>'
-    cards = []
-    # 只遍历 data/ 的一级子目录；每个目录下展示该目录里的 PNG 与 CSV/TXT
-    dirs = [d for d in DATA_DIR.iterdir() if d.is_dir()]
-    dirs.sort(key=lambda p: p.stat().st_mtime, reverse=True)
-    for d in dirs:
-        imgs = sorted(d.glob("*.png"))
-        docs = sorted([*d.glob("*.csv"), *d.glob("*.txt")])
+# 参数依次为 (href, href, name, name) / (href, name)，均已编码/转义
+_TILE_TMPL = (
+    '<a class="tile" href="%s" target="_blank" rel="noreferrer">'
+    '<img loading="lazy" src="%s" alt="%s">'
+    '<div class="cap">%s</div></a>'
+)
+_DL_TMPL = '<li><a href="%s">%s</a></li>'
+
+_BY_NAME = operator.attrgetter("name")
+_ROUTE   = {".png": 0, ".csv": 1, ".txt": 1}   # 后缀 -> 桶：0 图片 / 1 可下载日志
+
+# 每个 run 目录只读一次，按后缀分桶（代替 3 次 glob）
+# run 目录在扫描途中被删掉时返回 None，由调用方跳过
+def _scan_one_run(d: os.DirEntry) -> tuple[list[os.DirEntry], list[os.DirEntry]] | None:
+    imgs, docs = [], []
+    buckets = (imgs, docs)
+    try:
+        with os.scandir(d.path) as it:
+            for p in it:
+                n = p.name
+                i = _ROUTE.get(n[n.rfind("."):].lower())
+                if i is not None:
+                    buckets[i].append(p)
+    except FileNotFoundError:
+        return None
+    # 同一目录下按文件名排序即等价于按路径排序
+    imgs.sort(key=_BY_NAME)
+    docs.sort(key=_BY_NAME)
+    return imgs, docs
+
+RunInfo = tuple[os.DirEntry, list[os.DirEntry], list[os.DirEntry]]
+
+# data/ 的一级子目录：同一遍里先按 d_type 过滤（不触发 stat），再取一次 stat
+# 产出 (mtime_ns, name, entry)
+def _run_dirs(it: Iterator[os.DirEntry]) -> Iterator[tuple[int, str, os.DirEntry]]:
+    with it:
+        for e in it:
+            if not e.is_dir(follow_symlinks=False):
+                continue
+            try:
+                mtime_ns = e.stat().st_mtime_ns
+            except FileNotFoundError:   # 扫描途中被删掉的 run
+                continue
+            yield mtime_ns, e.name, e
+
+# [(entry, pngs, docs), ...]，按 mtime 新 -> 旧；data/ 不存在时返回 None
+def list_runs() -> list[RunInfo] | None:
+    # 不先 exists() 再 scandir：直接打开，目录不存在时由 scandir 报错
+    try:
+        it = os.scandir(DATA_DIR)
+    except FileNotFoundError:
+        return None
+    # mtime 新 -> 旧，相同时按名字升序；name 在目录内唯一，不会比到 entry
+    dirs = sorted(_run_dirs(it), key=lambda t: (-t[0], t[1]))
+    # readdir 是 I/O 等待（网络盘上尤其明显），用线程池并行扫描；map 保持顺序
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        scanned = list(ex.map(_scan_one_run, [e for _, _, e in dirs]))
+    return [(e, *r) for (_, _, e), r in zip(dirs, scanned) if r is not None]
+
+# 逐个 run 产出卡片 HTML，由调用方直接写入文件
+def runs_sections() -> Iterator[str]:
+    runs = list_runs()
+    if runs is None:
+        yield '<div class="muted">No data/ directory.</div>'
+        return
+    # 每个目录下展示该目录里的 PNG 与 CSV/TXT
+    for d, imgs, docs in runs:
         tiles = "".join(
-            f"""
-            <a class="tile" href="{q(p.relative_to(ROOT))}" target="_blank" rel="noreferrer">
-              <img loading="lazy" src="{q(p.relative_to(ROOT))}" alt="{h(p.name)}">
-              <div class="cap">{h(p.name)}</div>
-            </a>
-            """
-            for p in imgs
-        )
-        dl = "".join(
-            f'<li><a href="{q(p.relative_to(ROOT))}">{h(p.name)}</a></li>' for p in docs
+            _TILE_TMPL % (u, u, n, n)
+            for u, n in [(q(_rel(p.path)), h(p.name)) for p in imgs]
         )
+        dl = "".join(_DL_TMPL % (q(_rel(p.path)), h(p.name)) for p in docs)
         empty = "" if (imgs or docs) else '<div class="muted">No plots or logs in this run.</div>'
-        cards.append(
-            f"""
+        yield f"""
             <section class="card">
               <h3>{h(d.name)}</h3>
               {'<div class="run-grid">'+tiles+'</div>' if tiles else ''}
@@ -143,47 +216,104 @@ def runs_sections() -> str:
               {empty}
             </section>
             """
-        )
-    return "\n".join(cards)
+
+# ------------------------ 增量：输入指纹 ------------------------
+def _walk(root: str):
+    try:
+        with os.scandir(root) as it:
+            for e in it:
+                yield e
+                if e.is_dir(follow_symlinks=False):
+                    yield from _walk(e.path)
+    except FileNotFoundError:
+        return
+
+def tree_signature() -> str:
+    # 页面只取决于：data/ 与 notebooks/ 下的文件和目录（空 run 也出卡片，run 顺序看目录 mtime）、
+    # 根目录 .ipynb、页眉、本脚本、仓库/分支名
+    lines = [f"{REPO_FULL}@{BRANCH}"]
+    entries = [*_walk(str(DATA_DIR)), *_walk(str(NB_DIR))]
+    with os.scandir(ROOT) as it:
+        entries += [e for e in it if e.name.endswith(".ipynb")]
+    for e in entries:
+        st = e.stat(follow_symlinks=False)   # 悬空符号链接不应让整个构建失败
+        lines.append(f"{e.path}|{st.st_mtime_ns}|{st.st_size}")
+    for p in (Path(__file__).resolve(), ROOT / "_site-header.html", ROOT.parent / "_site-header.html"):
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        lines.append(f"{p}|{st.st_mtime_ns}|{st.st_size}")
+    lines.sort()
+    return hashlib.blake2b("\n".join(lines).encode("utf-8"), digest_size=16).hexdigest()
 
 # ------------------------ 生成 HTML ------------------------
-def build_html() -> str:
-    header = load_site_header()
-    now_str = datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
+# 页脚只含模块级常量，导入时编码一次
+_FOOTER_BYTES = (
+    f'<div class="center muted" style="margin:24px 0;">Last updated: {_NOW_STR} — {OWNER}/{REPO_NAME}@{BRANCH}</div>\n'
+    '</main></body></html>'
+).encode("utf-8")
+
+# 按分区直接写入已打开的二进制文件，不在内存中拼出整页；静态片段直接写 bytes，只有动态部分过编码
+def write_html(fp: BinaryIO) -> None:
+    def w(s: str) -> None:
+        fp.write(s.encode("utf-8"))
 
     nbs = list_notebooks()
 
-    html = [header, '<main class="container">']
+    fp.write(_HEADER_BYTES)
+    fp.write(b'<main class="container">\n')
 
     # Notebooks（View (nbviewer) + Download）
-    html.append('<section class="card">')
-    html.append('<h2>Notebooks</h2>')
+    fp.write(b'<section class="card">\n<h2>Notebooks</h2>\n')
     if nbs:
         for rel, view_url, dl_url in nbs:
-            label = Path(rel).stem.replace("-", " ")
-            html.append('<div style="margin:10px 0;">')
-            html.append(f'<b>{h(label)}</b><br/>')
-            html.append(f'<a class="btn" href="{view_url}" target="_blank" rel="noreferrer">View (nbviewer)</a>')
-            html.append(f'<a class="btn" href="{dl_url}" target="_blank" rel="noreferrer">Download (.ipynb)</a>')
-            html.append('</div>')
+            label = rel.rpartition("/")[2].removesuffix(".ipynb").replace("-", " ")
+            w(
+                f'<div style="margin:10px 0;"><b>{h(label)}</b><br/>'
+                f'<a class="btn" href="{view_url}" target="_blank" rel="noreferrer">View (nbviewer)</a>'
+                f'<a class="btn" href="{dl_url}" target="_blank" rel="noreferrer">Download (.ipynb)</a>'
+                '</div>\n'
+            )
     else:
-        html.append('<div class="muted">No notebooks yet.</div>')
-    html.append('</section>')
+        fp.write(b'<div class="muted">No notebooks yet.</div>\n')
+    fp.write(b'</section>\n')
 
     # ✅ 移除 “Selected Figures” 整个分区（避免与 Recent Runs 重复）
 
     # Recent Runs（原结构不变）
-    html.append('<section class="card">')
-    html.append('<h2>Recent Runs</h2>')
-    html.append(runs_sections())
-    html.append('</section>')
+    fp.write(b'<section class="card">\n<h2>Recent Runs</h2>\n')
+    for card in runs_sections():
+        w(card)
+    fp.write(b'</section>\n')
 
-    html.append(f'<div class="center muted" style="margin:24px 0;">Last updated: {now_str} — {OWNER}/{REPO_NAME}@{BRANCH}</div>')
-    html.append('</main></body></html>')
-    return "\n".join(html)
+    fp.write(_FOOTER_BYTES)
 
 def main():
-    OUT_HTML.write_text(build_html(), encoding="utf-8")
+    # 增量跳过只对本地有用：CI 每次全新 checkout（无 .cache、mtime 全部重置），指纹永远对不上，
+    # 算了也是白走一遍 data/；且不写 .cache，避免它被一起上传到 Pages
+    sig = None if IN_CI else tree_signature()
+    if sig is not None:
+        try:
+            old_sig = SIG_FILE.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            old_sig = None
+        if old_sig == sig and OUT_HTML.exists():
+            print(f"[mbe3-controller] {OUT_HTML} is up to date")
+            return
+    # 先写同目录临时文件再 os.replace：中断时不会留下半截 index.html
+    tmp = OUT_HTML.with_suffix(".html.tmp")
+    try:
+        with open(tmp, "wb", buffering=1 << 20) as f:
+            write_html(f)
+        os.replace(tmp, OUT_HTML)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    # 指纹在页面写完后再落盘；中途失败时下次会重新生成
+    if sig is not None:
+        SIG_FILE.parent.mkdir(exist_ok=True)
+        SIG_FILE.write_text(sig, encoding="utf-8")
     print(f"[mbe3-controller] Wrote {OUT_HTML}")
 
 if __name__ == "__main__":